@@ -1,16 +1,54 @@
 import os
 import json
+import zlib
+import re
+import hashlib
+import threading
+from functools import wraps
+from timeit import default_timer
 
-from flask import current_app
+from flask import (
+    current_app,
+    has_request_context,
+    request,
+    stream_with_context,
+    url_for,
+)
 from jinja2 import Markup, contextfunction
 from werkzeug.routing import BuildError
 from logging import getLevelName
 
+# times this module's own definitions; flask and jinja2 are already
+# imported by the app by the time it imports flask_webpack
+_IMPORT_STARTED = default_timer()
+
+_INCLUDED_ASSETS = "flask_webpack.included_assets"
+_FLUSH = "<!-- flask-webpack:flush -->"
+_HASHED_FILENAME = re.compile(r"[.~_-]([0-9a-fA-F]{8,})(?:\.|$)")
+
 
 def _noop(*args, **kwargs):
     pass
 
 
+def _time_first_render(method):
+    """decorator: records how long the first call of a template global takes
+    when profiling, including any manifest loading deferred until then.
+    """
+
+    @wraps(method)
+    def timed(self, *args, **kwargs):
+        if not self.profile or "first_render" in self.metrics["timings"]:
+            return method(self, *args, **kwargs)
+        started = default_timer()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._record_timing("first_render", started)
+
+    return timed
+
+
 def _merge(*key_value_pairs):
     return {key: value for kvp in key_value_pairs for key, value in kvp.items()}
 
@@ -41,6 +79,8 @@ def _get_attrs(attrs):
 
 
 def _escape(s):
+    # chained str.replace beats str.translate and re.sub for the short
+    # strings found in HTML attributes
     return (
         s.replace("&", "&amp;")
         .replace("<", "&lt;")
@@ -50,24 +90,84 @@ def _escape(s):
     )
 
 
+def _serialize_attrs(attrs):
+    """helper: returns str HTML-style key-value pairs in a single loop.
+
+    Args:
+        attrs (dict): unnested HTML tag attributes
+
+    Returns:
+        str: HTML-style key-value pairs
+    """
+    pairs = []
+    for key, value in attrs.items():
+        if value is True:
+            pairs.append(key)
+        elif value is not False:
+            pairs.append('{}="{}"'.format(key, _escape(str(value))))
+    return " ".join(pairs)
+
+
 def _markup_kvp(**attrs):
     """helper: returns str HTML-style key-value pairs"""
-    attrs = _get_attrs(attrs)
-    return " ".join(
-        key if value is True else '{}="{}"'.format(key, _escape(str(value)))
-        for key, value in attrs.items()
-        if value is not False
+    return _serialize_attrs(_get_attrs(attrs))
+
+
+def _gzip(data, level=9):
+    """helper: returns bytes gzip-compressed, by default at the highest level"""
+    gzip = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return gzip.compress(data) + gzip.flush()
+
+
+def _script_json(value):
+    """helper: returns minified JSON that is safe to inline in a <script>"""
+    return (
+        json.dumps(value, separators=(",", ":"), sort_keys=True)
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
     )
 
 
-def for_each_unique_chunk(ctx, chunk_urls, callback, unique=True):
+def _hash_file(path, length=12):
+    """helper: returns the leading hex digits of the md5 of a file's contents"""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def _hash_file_or_none(path):
+    """helper: returns _hash_file(path), or None if the file is unreadable"""
+    try:
+        return _hash_file(path)
+    except (IOError, OSError):
+        return None
+
+
+def _included_assets(ctx):
+    """helper: returns the set of chunk urls already written out.  Streamed
+    responses share one set per request, other renders one set per template.
+    """
+    if has_request_context() and _INCLUDED_ASSETS in request.environ:
+        return request.environ[_INCLUDED_ASSETS]
     if not hasattr(ctx.eval_ctx, "webpack_included_assets"):
         ctx.eval_ctx.webpack_included_assets = set()
-    used = ctx.eval_ctx.webpack_included_assets
+    return ctx.eval_ctx.webpack_included_assets
+
+
+def _unique_chunks(ctx, chunk_urls, unique=True):
+    used = _included_assets(ctx)
     for chunk_url in chunk_urls:
         if chunk_url not in used or not unique:
             used.add(chunk_url)
-            callback(chunk_url)
+            yield chunk_url
+
+
+def for_each_unique_chunk(ctx, chunk_urls, callback, unique=True):
+    for chunk_url in _unique_chunks(ctx, chunk_urls, unique=unique):
+        callback(chunk_url)
 
 
 def _warn(
@@ -142,6 +242,22 @@ class Webpack(object):
         self.assets_url = assets_url or ""
         self.assets = assets
         self.manifest_path = manifest_path
+        self.build_path = None
+        self.track_asset_bytes = False
+        self.asset_budgets = {}
+        self.metrics = {"asset_bytes": {}, "timings": {}}
+        self.profile = False
+        self._lazy_app = None
+        self._manifest_lock = threading.Lock()
+        self.manifest_generation = 0
+        self._file_sizes = {}
+        self._reset_manifest_caches()
+        self.static_folder = None
+        self.static_hashes = None
+        self._static_hash_cache = None
+        self._lazy_static_hashes = False
+        self.manifest_error = None
+        self._verification = None
         if app is not None:
             self.init_app(app)
         else:
@@ -156,6 +272,10 @@ class Webpack(object):
         :param app: Flask application
         :return: None
         """
+        started = default_timer()
+        self.profile = app.config.get("WEBPACK_PROFILE", False)
+        if self.profile:
+            self.metrics["timings"]["import"] = _IMPORT_SECONDS
         debug = (
             app.config.get("DEBUG")
             or os.environ.get("FLASK_DEBUG")
@@ -174,17 +294,69 @@ class Webpack(object):
 
         # Setup a few sane defaults
         app.config.setdefault("WEBPACK_ASSETS_URL", None)
-        self._set_asset_paths(app)
+        app.config.setdefault("WEBPACK_BUILD_PATH", None)
+        app.config.setdefault("WEBPACK_ASSET_BUDGETS", {})
+        self.build_path = os.path.join(
+            app.root_path,
+            app.config["WEBPACK_BUILD_PATH"] or app.static_folder or "",
+        )
+        self.asset_budgets = app.config["WEBPACK_ASSET_BUDGETS"] or {}
+        self.track_asset_bytes = app.config.get(
+            "WEBPACK_TRACK_ASSET_BYTES", bool(self.asset_budgets)
+        )
+        app.config.setdefault("WEBPACK_PRECACHE_URL", None)
+        if app.config.get("WEBPACK_LAZY_MANIFEST"):
+            self._lazy_app = app
+            self._check_manifest_path(app)
+        else:
+            self._set_asset_paths(app)
+
+        if app.config.get("WEBPACK_HASH_STATIC") and app.static_folder:
+            self.static_folder = app.static_folder
+            self._static_hash_cache = app.config.get(
+                "WEBPACK_STATIC_HASH_CACHE"
+            )
+            if app.config.get("WEBPACK_LAZY_MANIFEST"):
+                self.static_hashes = {}
+                self._lazy_static_hashes = True
+            else:
+                self._hash_static_files(self._static_hash_cache)
+
+        verify = app.config.get("WEBPACK_VERIFY_ASSETS")
+        if verify == "background":
+            self._verification = {"ready": False, "pending": True}
+            thread = threading.Thread(target=self._verify_assets_in_background)
+            thread.daemon = True
+            thread.start()
+        elif verify:
+            self.verify_assets()
 
         # We only want to refresh the webpack stats in development mode,
         # not everyone sets this setting, so let's assume it's production.
         if debug:
             app.before_request(self._refresh_webpack_stats)
 
+        if self.track_asset_bytes:
+            app.after_request(self._report_asset_bytes)
+
+        if app.config["WEBPACK_PRECACHE_URL"]:
+            app.add_url_rule(
+                app.config["WEBPACK_PRECACHE_URL"],
+                "webpack_precache",
+                self._serve_precache_manifest,
+            )
+
+        if hasattr(app, "cli"):
+            self._add_cli_commands(app)
+
         if hasattr(app, "add_template_global"):
             app.add_template_global(self.javascript_tag)
             app.add_template_global(self.stylesheet_tag)
+            app.add_template_global(self.iter_javascript_tags)
+            app.add_template_global(self.iter_stylesheet_tags)
+            app.add_template_global(self.webpack_flush)
             app.add_template_global(self.asset_urls_for)
+            app.add_template_global(self.webpack_runtime_tag)
             # for backwards compatibility
             app.add_template_global(self.asset_url_for)
         else:
@@ -192,10 +364,16 @@ class Webpack(object):
             ctx = {
                 "javascript_tag": self.javascript_tag,
                 "stylesheet_tag": self.stylesheet_tag,
+                "iter_javascript_tags": self.iter_javascript_tags,
+                "iter_stylesheet_tags": self.iter_stylesheet_tags,
+                "webpack_flush": self.webpack_flush,
                 "asset_urls_for": self.asset_urls_for,
+                "webpack_runtime_tag": self.webpack_runtime_tag,
             }
             app.context_processor(lambda: ctx)
 
+        self._record_timing("init_app", started)
+
     def _set_asset_paths(self, app):
         """
         Read in the manifest.json file which acts as a manifest for assets.
@@ -208,12 +386,17 @@ class Webpack(object):
             "WEBPACK_MANIFEST_PATH", self.manifest_path
         )
         if webpack_stats is None:
+            if not self.assets:
+                self.manifest_error = "'WEBPACK_MANIFEST_PATH' is not set"
             self.log("[Flask-Webpack] 'WEBPACK_MANIFEST_PATH' is not set")
         else:
             try:
+                started = default_timer()
                 with app.open_resource(webpack_stats, "r") as stats_json:
                     stats = json.load(stats_json)
+                self._record_timing("manifest_parse", started)
 
+                started = default_timer()
                 self.assets_url = (
                     app.config.get("WEBPACK_ASSETS_URL")
                     or stats.get("publicPath")
@@ -222,14 +405,79 @@ class Webpack(object):
                     or ""
                 )
                 self.assets = stats.get("assets") or stats
+                self.manifest_generation += 1
+                self.manifest_error = None
+                self._reset_manifest_caches()
+                self._record_timing("manifest_index", started)
             except IOError:
-                message = (
-                    "[Flask-Webpack] WEBPACK_MANIFEST_PATH='{}' must point to"
-                    " a valid json file."
-                ).format(webpack_stats)
-                self.log(message)
-                if self.log_level == "ERROR":
-                    raise RuntimeError(message)
+                self._manifest_unreadable(webpack_stats)
+
+    def _check_manifest_path(self, app):
+        """
+        Check that the manifest file exists without reading it, so that a
+        deferred manifest with a bad path still fails at startup.
+
+        :param app: Flask application
+        :return: None
+        """
+        webpack_stats = app.config.get(
+            "WEBPACK_MANIFEST_PATH", self.manifest_path
+        )
+        if webpack_stats is None:
+            if not self.assets:
+                self.manifest_error = "'WEBPACK_MANIFEST_PATH' is not set"
+        elif not os.path.isfile(os.path.join(app.root_path, webpack_stats)):
+            self._manifest_unreadable(webpack_stats)
+
+    def _manifest_unreadable(self, webpack_stats):
+        """
+        Record and log a manifest path that could not be read, raising if the
+        log level is ERROR.
+
+        :param webpack_stats: str the configured manifest path
+        :return: None
+        """
+        message = (
+            "[Flask-Webpack] WEBPACK_MANIFEST_PATH='{}' must point to"
+            " a valid json file."
+        ).format(webpack_stats)
+        self.manifest_error = message
+        self.log(message)
+        if self.log_level == "ERROR":
+            raise RuntimeError(message)
+
+    def _ensure_manifest(self):
+        """
+        Load a manifest deferred by WEBPACK_LAZY_MANIFEST, once.
+
+        :return: None
+        """
+        if self._lazy_app is not None:
+            with self._manifest_lock:
+                if self._lazy_app is not None:
+                    self._set_asset_paths(self._lazy_app)
+                    self._lazy_app = None
+
+    def _record_timing(self, name, started):
+        """
+        Store the seconds since started in self.metrics when profiling.
+
+        :param name: str the name of the timed stage
+        :param started: float a default_timer() reading
+        :return: None
+        """
+        if self.profile:
+            self.metrics["timings"][name] = default_timer() - started
+
+    def _reset_manifest_caches(self):
+        """
+        Drop everything derived from the previously loaded manifest.
+
+        :return: None
+        """
+        self._chunk_sizes = {}
+        self._precache_bodies = {}
+        self._runtime_script = None
 
     def _refresh_webpack_stats(self):
         """
@@ -239,6 +487,389 @@ class Webpack(object):
         :return: None
         """
         self._set_asset_paths(current_app)
+        if self.static_hashes:
+            # static files are rehashed on demand, so edits get a new ?v=
+            self.static_hashes = {}
+
+    def _chunk_size(self, chunk_url):
+        """
+        Measure the file behind a chunk url in the build directory.  Sizes are
+        looked up once per loaded manifest, and a file is only compressed
+        again if its mtime or size changed.
+
+        :param chunk_url: str a url from asset_urls_for
+        :return: (int, int) raw and gzipped byte counts, (0, 0) if the chunk
+            is not on disk
+        """
+        if chunk_url in self._chunk_sizes:
+            return self._chunk_sizes[chunk_url]
+        sizes = (0, 0)
+        path = self._chunk_path(chunk_url)
+        if path:
+            try:
+                stat = os.stat(path)
+                key = (path, stat.st_mtime, stat.st_size)
+                sizes = self._file_sizes.get(key)
+                if sizes is None:
+                    with open(path, "rb") as chunk:
+                        data = chunk.read()
+                    # level 6 sizes are within a few percent of level 9
+                    sizes = (len(data), len(_gzip(data, level=6)))
+                    self._file_sizes[key] = sizes
+            except (IOError, OSError):
+                sizes = (0, 0)
+        self._chunk_sizes[chunk_url] = sizes
+        return sizes
+
+    def _chunk_path(self, chunk_url):
+        """
+        :param chunk_url: str a url from asset_urls_for
+        :return: str the path of the chunk in the build directory, or None if
+            the url is not served from self.assets_url
+        """
+        prefix = self.assets_url or ""
+        if not self.build_path or not chunk_url.startswith(prefix):
+            return None
+        return os.path.join(self.build_path, chunk_url[len(prefix) :])
+
+    def _account_chunk(self, chunk_url):
+        """
+        Add the size of an emitted chunk to the current response's total.
+
+        :param chunk_url: str the url of a chunk written into a tag
+        :return: None
+        """
+        if not self.track_asset_bytes or not has_request_context():
+            return
+        raw, gzipped = self._chunk_size(chunk_url)
+        totals = request.environ.get("flask_webpack.asset_bytes", (0, 0))
+        request.environ["flask_webpack.asset_bytes"] = (
+            totals[0] + raw,
+            totals[1] + gzipped,
+        )
+
+    def _report_asset_bytes(self, response):
+        """
+        Write the asset byte totals of a response into its headers and
+        self.metrics, then check them against the endpoint's budget.
+
+        :param response: the flask response
+        :return: the flask response
+        """
+        totals = request.environ.get("flask_webpack.asset_bytes")
+        if totals is None:
+            return response
+        raw, gzipped = totals
+        response.headers["X-Webpack-Asset-Bytes"] = str(raw)
+        response.headers["X-Webpack-Asset-Gzip-Bytes"] = str(gzipped)
+        self._check_asset_bytes(totals)
+        return response
+
+    def _check_asset_bytes(self, totals):
+        """
+        Record the asset byte totals of the current request in self.metrics
+        and check them against the endpoint's budget.
+
+        :param totals: (int, int) raw and gzipped bytes of emitted chunks
+        :return: None
+        """
+        raw, gzipped = totals
+        endpoint = request.endpoint
+        seen = self.metrics["asset_bytes"].get(endpoint, {})
+        self.metrics["asset_bytes"][endpoint] = {
+            "raw": raw,
+            "gzip": gzipped,
+            "max_raw": max(raw, seen.get("max_raw", 0)),
+            "max_gzip": max(gzipped, seen.get("max_gzip", 0)),
+        }
+
+        budget = self.asset_budgets.get(endpoint)
+        if budget is not None and gzipped > budget:
+            message = (
+                "[flask-webpack] endpoint {} emitted {} gzipped asset bytes,"
+                " over its budget of {}"
+            ).format(endpoint, gzipped, budget)
+            self.log(message)
+            if current_app.testing:
+                raise RuntimeError(message)
+
+    def _hash_static_files(self, cache_path=None):
+        """
+        Hash every file under the static folder in parallel.  Hashes are kept
+        in a JSON file at cache_path, keyed by the mtime and size of each file,
+        so that unchanged files are not read again on the next startup.
+
+        :param cache_path: str an optional path to the persistent hash cache
+        :return: None
+        """
+        cache = {}
+        if cache_path:
+            try:
+                with open(cache_path, "r") as cache_json:
+                    cache = json.load(cache_json)
+            except (IOError, ValueError):
+                self.log(
+                    "[flask-webpack] rebuilding static hash cache {}".format(
+                        cache_path
+                    )
+                )
+
+        hashes, stale = {}, []
+        for root, _, files in os.walk(self.static_folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_folder)
+                name = name.replace(os.sep, "/")
+                try:
+                    stat = os.stat(path)
+                except (IOError, OSError) as e:
+                    self.log(
+                        "[flask-webpack] not hashing {}: {}".format(path, e)
+                    )
+                    continue
+                key = [stat.st_mtime, stat.st_size]
+                cached = cache.get(name)
+                if cached and cached[:2] == key:
+                    hashes[name] = cached
+                else:
+                    stale.append((name, path, key))
+
+        if stale:
+            from multiprocessing.pool import ThreadPool
+
+            pool = ThreadPool(min(8, len(stale)))
+            try:
+                digests = pool.map(
+                    _hash_file_or_none, [path for _, path, _ in stale]
+                )
+            finally:
+                pool.close()
+            for (name, path, key), digest in zip(stale, digests):
+                if digest is None:
+                    self.log("[flask-webpack] could not hash {}".format(path))
+                else:
+                    hashes[name] = key + [digest]
+
+        if cache_path and (stale or len(hashes) != len(cache)):
+            try:
+                with open(cache_path, "w") as cache_json:
+                    json.dump(hashes, cache_json)
+            except IOError:
+                self.log(
+                    "[flask-webpack] could not write static hash cache {}".format(
+                        cache_path
+                    )
+                )
+        self.static_hashes = {name: hashes[name][2] for name in hashes}
+
+    def _static_url_for(self, asset):
+        """
+        Fingerprint a file in the static folder that is not in the manifest.
+
+        :param asset: str a path relative to the static folder
+        :return: str the static url with a content-hash query, or None if the
+            file does not exist.  Like url_for, needs a request context or a
+            SERVER_NAME.
+        """
+        if self.static_hashes is None:
+            return None
+        if self._lazy_static_hashes:
+            with self._manifest_lock:
+                if self._lazy_static_hashes:
+                    self._hash_static_files(self._static_hash_cache)
+                    self._lazy_static_hashes = False
+        name = os.path.normpath(asset)
+        if (
+            os.path.isabs(name)
+            or name == os.pardir
+            or name.startswith(os.pardir + os.sep)
+        ):
+            return None
+        name = name.replace(os.sep, "/")
+        digest = self.static_hashes.get(name)
+        if digest is None:
+            path = os.path.join(self.static_folder, name)
+            if not os.path.isfile(path):
+                return None
+            digest = _hash_file_or_none(path)
+            if digest is None:
+                return None
+            self.static_hashes[name] = digest
+        return url_for("static", filename=name, v=digest)
+
+    def _chunk_revision(self, chunk_url):
+        """
+        :param chunk_url: str a url from asset_urls_for
+        :return: str the hash in the chunk's filename, else a hash of its
+            contents, else None
+        """
+        hashed = _HASHED_FILENAME.search(chunk_url.rsplit("/", 1)[-1])
+        if hashed:
+            return hashed.group(1)
+        path = self._chunk_path(chunk_url)
+        if path and os.path.isfile(path):
+            return _hash_file(path)
+        return None
+
+    def precache_manifest(self, entries=None):
+        """
+        List the chunks of the loaded manifest in the format of a Workbox
+        precache manifest.
+
+        :param entries: List[str] asset names to include, defaults to all
+        :return: List[dict] unique {"url": str, "revision": str} entries
+        """
+        self._ensure_manifest()
+        if entries is None:
+            entries = self.assets.keys()
+        seen, manifest = set(), []
+        for entry in entries:
+            chunk_urls = self.asset_urls_for(entry) or []
+            if not isinstance(chunk_urls, list):
+                chunk_urls = [chunk_urls]
+            for chunk_url in chunk_urls:
+                if chunk_url not in seen:
+                    seen.add(chunk_url)
+                    manifest.append(
+                        {
+                            "url": chunk_url,
+                            "revision": self._chunk_revision(chunk_url),
+                        }
+                    )
+        return manifest
+
+    def _precache_body(self, entries=None):
+        """
+        Render the precache manifest once per loaded manifest and filter.
+
+        :param entries: List[str] asset names to include, defaults to all
+        :return: (bytes, bytes, str) the JSON body, its gzipped form, and etag
+        """
+        self._ensure_manifest()
+        if entries is not None:
+            entries = tuple(sorted(set(e for e in entries if e in self.assets)))
+        if entries not in self._precache_bodies:
+            if len(self._precache_bodies) >= 64:
+                self._precache_bodies = {}
+            body = json.dumps(
+                self.precache_manifest(entries), separators=(",", ":")
+            ).encode("utf-8")
+            etag = hashlib.md5(body).hexdigest()
+            self._precache_bodies[entries] = (body, _gzip(body), etag)
+        return self._precache_bodies[entries]
+
+    def _serve_precache_manifest(self):
+        """
+        View serving the precache manifest at WEBPACK_PRECACHE_URL.  Repeated
+        `entry` query args restrict it to the chunks of those asset names.
+
+        :return: a flask response
+        """
+        entries = request.args.getlist("entry") or None
+        body, gzipped, etag = self._precache_body(entries)
+        response = current_app.response_class(body, mimetype="application/json")
+        response.vary.add("Accept-Encoding")
+        if "gzip" in request.accept_encodings:
+            response.set_data(gzipped)
+            response.content_encoding = "gzip"
+            etag += "-gzip"
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def _add_cli_commands(self, app):
+        """
+        Register `flask webpack-precache`, which prints the precache manifest.
+
+        :param app: Flask application
+        :return: None
+        """
+        import click
+
+        @app.cli.command("webpack-precache")
+        @click.option(
+            "--entry", multiple=True, help="only include this asset name"
+        )
+        def webpack_precache(entry):
+            """Print a Workbox precache manifest of the webpack assets."""
+            body = self._precache_body(list(entry) or None)[0]
+            click.echo(body.decode("utf-8"))
+
+    def verify_assets(self):
+        """
+        Check that every chunk named in the manifest exists in the build
+        directory, which may be the static folder or a local mirror of a CDN.
+        Files are checked concurrently.
+
+        :return: dict the result, also returned by health()
+        """
+        self._ensure_manifest()
+        assets, generation = self.assets, self.manifest_generation
+        chunks, seen = [], set()
+        for packed_asset in assets.values():
+            if not isinstance(packed_asset, (list, tuple)):
+                packed_asset = [packed_asset]
+            for chunk in packed_asset:
+                if "//" not in chunk and chunk not in seen:
+                    seen.add(chunk)
+                    chunks.append(chunk)
+
+        missing = []
+        if chunks and self.build_path:
+            paths = [os.path.join(self.build_path, chunk) for chunk in chunks]
+            from multiprocessing.pool import ThreadPool
+
+            pool = ThreadPool(min(16, len(paths)))
+            try:
+                exists = pool.map(os.path.isfile, paths)
+            finally:
+                pool.close()
+            missing = [chunk for chunk, ok in zip(chunks, exists) if not ok]
+        elif chunks:
+            missing = chunks
+
+        for chunk in missing:
+            self.log("[flask-webpack] missing chunk file {}".format(chunk))
+        self._verification = {
+            "ready": not missing,
+            "pending": False,
+            "verified_generation": generation,
+            "checked": len(chunks),
+            "missing": missing,
+        }
+        return self.health()
+
+    def _verify_assets_in_background(self):
+        """
+        Thread target for verify_assets() that records a failure in health()
+        rather than leaving the verification pending forever.
+
+        :return: None
+        """
+        try:
+            self.verify_assets()
+        except Exception as e:
+            message = "[flask-webpack] asset verification failed: {}".format(e)
+            self.log(message)
+            self._verification = {
+                "ready": False,
+                "pending": False,
+                "error": message,
+            }
+
+    def health(self):
+        """
+        Report whether the manifest loaded and its chunks were all found by
+        the last verify_assets().  Cheap enough for a readiness probe.
+
+        :return: dict with a bool "ready", "error" for a manifest that failed
+            to load or a failed verification, and the results of the last
+            verification if any
+        """
+        health = dict(self._verification or {"ready": True})
+        health["ready"] = health["ready"] and self.manifest_error is None
+        health["error"] = self.manifest_error or health.get("error")
+        health["manifest_generation"] = self.manifest_generation
+        return health
 
     def _warn_missing(self, missing, type_info="asset"):
         """
@@ -254,6 +885,7 @@ class Webpack(object):
         )
 
     @contextfunction
+    @_time_first_render
     def javascript_tag(self, ctx, *assets, **attrs):
         """
         Convenience tag to output 1 or more javascript tags.
@@ -263,27 +895,36 @@ class Webpack(object):
         :param attrs: dict <script> tag attr name-value pairs
         :return: Script tag(s) with the named attrs containing the named asset
         """
-        unique = attrs.pop("unique", True)
-        attrs = _get_attrs(attrs)
-        tags = []
+        return Markup(
+            "\n".join(self.iter_javascript_tags(ctx, *assets, **attrs))
+        )
 
-        def make_tag(chunk_url):
-            tag_attrs = _markup_kvp(**attrs)
-            tags.append(
-                '<script src="{}" {}></script>'.format(chunk_url, tag_attrs)
-            )
+    @contextfunction
+    def iter_javascript_tags(self, ctx, *assets, **attrs):
+        """
+        Lazily output 1 or more javascript tags, one at a time.  Takes the same
+        arguments as javascript_tag.
 
+        :return: generator of Markup <script> tags
+        """
+        unique = attrs.pop("unique", True)
+        attrs = _get_attrs(attrs)
         all_chunk_urls = []
         for asset in assets:
             chunk_urls = self.resolve_ext(asset, extensions=["", ".js"])
             if chunk_urls:
                 all_chunk_urls += chunk_urls
             else:
-                tags.append(self._warn_missing(asset, "script"))
-        for_each_unique_chunk(ctx, all_chunk_urls, make_tag, unique=unique)
-        return Markup("\n".join(tags))
+                yield self._warn_missing(asset, "script")
+        tag_attrs = _serialize_attrs(attrs)
+        for chunk_url in _unique_chunks(ctx, all_chunk_urls, unique=unique):
+            self._account_chunk(chunk_url)
+            yield Markup(
+                '<script src="{}" {}></script>'.format(chunk_url, tag_attrs)
+            )
 
     @contextfunction
+    @_time_first_render
     def stylesheet_tag(self, ctx, *assets, **attrs):
         """
         Convenience tag to output 1 or more stylesheet tags.
@@ -294,14 +935,20 @@ class Webpack(object):
         :return: Markdown <link rel="stylesheet" .../>s containing the named
             assets
         """
-        tags = []
-        unique = attrs.pop("unique", True)
-        attrs = _merge({"rel": "stylesheet"}, _get_attrs(attrs))
+        return Markup(
+            "\n".join(self.iter_stylesheet_tags(ctx, *assets, **attrs))
+        )
 
-        def make_tag(url):
-            tag = '<link href="{}" {}>'.format(url, _markup_kvp(**attrs))
-            tags.append(tag)
+    @contextfunction
+    def iter_stylesheet_tags(self, ctx, *assets, **attrs):
+        """
+        Lazily output 1 or more stylesheet tags, one at a time.  Takes the same
+        arguments as stylesheet_tag.
 
+        :return: generator of Markup <link rel="stylesheet" .../>s
+        """
+        unique = attrs.pop("unique", True)
+        attrs = _merge({"rel": "stylesheet"}, _get_attrs(attrs))
         all_chunk_urls = []
         for asset in assets:
             # ordered by how frequency of extension occurence.
@@ -311,10 +958,98 @@ class Webpack(object):
             if chunks:
                 all_chunk_urls += chunks
             else:
-                tags.append(self._warn_missing(asset, "stylesheet"))
-        for_each_unique_chunk(ctx, all_chunk_urls, make_tag, unique=unique)
+                yield self._warn_missing(asset, "stylesheet")
+        tag_attrs = _serialize_attrs(attrs)
+        for url in _unique_chunks(ctx, all_chunk_urls, unique=unique):
+            self._account_chunk(url)
+            yield Markup('<link href="{}" {}>'.format(url, tag_attrs))
 
-        return Markup("\n".join(tags))
+    def webpack_flush(self):
+        """
+        Mark the point up to which stream_template should send what it has
+        rendered, e.g. just after the <head> asset tags.
+
+        :return: Markup flush marker, removed from the streamed output
+        """
+        return Markup(_FLUSH)
+
+    def stream_template(
+        self, template_name_or_list, buffer_size=8192, **context
+    ):
+        """
+        Render a template as a stream for a response.  Output is buffered up to
+        buffer_size characters, except at each `webpack_flush()` in the
+        template, where everything rendered so far is sent immediately.  Asset
+        tags are deduplicated across everything rendered in the request.
+        Asset byte totals are recorded and checked against the endpoint's
+        budget once the template is rendered, but cannot be sent as headers.
+
+        :param template_name_or_list: the name of the template to render
+        :param buffer_size: int the characters to buffer between flushes
+        :param context: the variables available in the template
+        :return: generator of str to be used as a response body
+        """
+        app = current_app._get_current_object()
+        app.update_template_context(context)
+        template = app.jinja_env.get_or_select_template(template_name_or_list)
+        request.environ.setdefault(_INCLUDED_ASSETS, set())
+
+        def generate():
+            buffered, size = [], 0
+            for piece in template.generate(context):
+                flush = _FLUSH in piece
+                if flush:
+                    # re rather than Markup.replace, which would escape _FLUSH
+                    piece = re.sub(re.escape(_FLUSH), "", piece)
+                buffered.append(piece)
+                size += len(piece)
+                if flush or size >= buffer_size:
+                    yield "".join(buffered)
+                    buffered, size = [], 0
+            if buffered:
+                yield "".join(buffered)
+            # after_request ran before streaming began, so check here instead
+            totals = request.environ.get("flask_webpack.asset_bytes")
+            if self.track_asset_bytes and totals is not None:
+                self._check_asset_bytes(totals)
+
+        return stream_with_context(generate())
+
+    @_time_first_render
+    def webpack_runtime_tag(self, nonce=None):
+        """
+        Inline script telling the webpack runtime where to load lazy chunks
+        from: it defines `__webpack_public_path__` as the configured assets
+        url and `__webpack_chunk_urls__` as a map of chunk name to hashed url.
+        The script is serialized once per loaded manifest.
+
+        :param nonce: str an optional CSP nonce for the <script> tag
+        :return: Markup <script> tag
+        """
+        self._ensure_manifest()
+        if self._runtime_script is None:
+            chunk_urls = {}
+            for name, chunk in self.assets.items():
+                if isinstance(chunk, (list, tuple)) or not chunk.endswith(
+                    ".js"
+                ):
+                    continue
+                if name.endswith(".js"):
+                    name = name[: -len(".js")]
+                chunk_urls[name] = (self.assets_url or "") + chunk
+            self._runtime_script = (
+                "window.__webpack_public_path__={};"
+                "window.__webpack_chunk_urls__={};"
+            ).format(
+                _script_json(self.assets_url or ""), _script_json(chunk_urls)
+            )
+        if nonce:
+            return Markup(
+                "<script {}>{}</script>".format(
+                    _markup_kvp(nonce=nonce), self._runtime_script
+                )
+            )
+        return Markup("<script>{}</script>".format(self._runtime_script))
 
     def asset_urls_for(self, asset):
         """
@@ -329,6 +1064,7 @@ class Webpack(object):
         if "//" in asset:
             return asset
 
+        self._ensure_manifest()
         if asset not in self.assets:
             return None
 
@@ -337,8 +1073,11 @@ class Webpack(object):
             packed_asset = [packed_asset]
         return [(self.assets_url or "") + chunk for chunk in packed_asset]
 
+    @_time_first_render
     def asset_url_for(self, asset, warn_multiple=True):
-        """Get one url for an asset name.
+        """Get one url for an asset name.  Names missing from the manifest fall
+        back to content-hashed urls of static files if WEBPACK_HASH_STATIC is
+        set.
 
         :param asset: str the name of the asset.
         :param warn_multiple: bool whether to warn if multiple chunks retreived.
@@ -356,6 +1095,10 @@ class Webpack(object):
                     log=self.log,
                     values=self.assets,
                 )
+        else:
+            static_url = self._static_url_for(asset)
+            if static_url:
+                return Markup(static_url)
 
     def resolve_ext(self, asset, extensions=[""]):
         """Find the first asset in the manifest
@@ -369,3 +1112,6 @@ class Webpack(object):
             resolved = self.asset_urls_for(asset + ext)
             if resolved:
                 return resolved
+
+
+_IMPORT_SECONDS = default_timer() - _IMPORT_STARTED
@@ -1,14 +1,18 @@
 # import json
-from flask import Flask
-from jinja2 import Markup
+from flask import Flask, Response
+from jinja2 import Markup, Template
 from jinja2.runtime import Context
 from typing import (
+    Any,
     Callable,
+    Iterator,
     Union,
     Optional,
     List,
     Callable,
     Dict,
+    Set,
+    Tuple,
     # TypeVar,
 )
 
@@ -19,9 +23,37 @@ _MarkupKvp = Dict[str, Union[str, bool, int, float]]
 def _escape(s: str) -> str: ...
 
 
+def _serialize_attrs(attrs: _MarkupKvp) -> str: ...
+
+
+def _gzip(data: bytes, level: int=9) -> bytes: ...
+
+
+def _script_json(value: object) -> str: ...
+
+
+def _hash_file(path: str, length: int=12) -> str: ...
+
+
 def _noop(*args: _Whatev, **kwargs: _Whatev) -> None: ...
 
 
+def _time_first_render(method: Callable[..., Any]) -> Callable[..., Any]: ...
+
+
+def _hash_file_or_none(path: str) -> Optional[str]: ...
+
+
+def _included_assets(ctx: Context) -> Set[str]: ...
+
+
+def _unique_chunks(
+    ctx: Context,
+    chunk_urls: List[str],
+    unique: bool=True
+) -> Iterator[str]: ...
+
+
 def for_each_unique_chunk(
     chunk_urls: List[str],
     callback: Callable[[str], str]
@@ -40,6 +72,19 @@ def _warn_missing(
 
 
 class Webpack(object):
+    assets_url: str
+    assets: Dict[str, Union[str, List[str]]]
+    manifest_path: Optional[str]
+    build_path: Optional[str]
+    track_asset_bytes: bool
+    asset_budgets: Dict[str, int]
+    metrics: Dict[str, Dict[str, Any]]
+    profile: bool
+    manifest_generation: int
+    manifest_error: Optional[str]
+    static_folder: Optional[str]
+    static_hashes: Optional[Dict[str, str]]
+
     def __init__(
         self,
         app: Optional[Flask]=None,
@@ -53,8 +98,54 @@ class Webpack(object):
 
     def _set_asset_paths(self, app: Flask) -> None: ...
 
+    def _check_manifest_path(self, app: Flask) -> None: ...
+
+    def _manifest_unreadable(self, webpack_stats: str) -> None: ...
+
+    def _ensure_manifest(self) -> None: ...
+
+    def _record_timing(self, name: str, started: float) -> None: ...
+
+    def _reset_manifest_caches(self) -> None: ...
+
     def _refresh_webpack_stats(self) -> None: ...
 
+    def _chunk_size(self, chunk_url: str) -> Tuple[int, int]: ...
+
+    def _chunk_path(self, chunk_url: str) -> Optional[str]: ...
+
+    def _account_chunk(self, chunk_url: str) -> None: ...
+
+    def _report_asset_bytes(self, response: Response) -> Response: ...
+
+    def _check_asset_bytes(self, totals: Tuple[int, int]) -> None: ...
+
+    def _hash_static_files(self, cache_path: Optional[str]=None) -> None: ...
+
+    def _static_url_for(self, asset: str) -> Optional[str]: ...
+
+    def _chunk_revision(self, chunk_url: str) -> Optional[str]: ...
+
+    def precache_manifest(
+        self,
+        entries: Optional[List[str]]=None
+    ) -> List[Dict[str, Optional[str]]]: ...
+
+    def _precache_body(
+        self,
+        entries: Optional[List[str]]=None
+    ) -> Tuple[bytes, bytes, str]: ...
+
+    def _serve_precache_manifest(self) -> Response: ...
+
+    def _add_cli_commands(self, app: Flask) -> None: ...
+
+    def verify_assets(self) -> Dict[str, Any]: ...
+
+    def _verify_assets_in_background(self) -> None: ...
+
+    def health(self) -> Dict[str, Any]: ...
+
     def _warn_missing(
         self,
         missing: str,
@@ -79,6 +170,35 @@ class Webpack(object):
         **more_attrs: Union[str, bool, int]
     ) -> Markup: ...
 
+    def iter_javascript_tags(
+        self,
+        ctx: Context,
+        *assets: str,
+        unique: bool = True,
+        attrs: _MarkupKvp = {},
+        **more_attrs: Union[str, bool, int, float]
+    ) -> Iterator[Markup]: ...
+
+    def iter_stylesheet_tags(
+        self,
+        ctx: Context,
+        *assets: str,
+        unique: bool = True,
+        attrs: _MarkupKvp = {},
+        **more_attrs: Union[str, bool, int]
+    ) -> Iterator[Markup]: ...
+
+    def webpack_flush(self) -> Markup: ...
+
+    def stream_template(
+        self,
+        template_name_or_list: Union[str, List[str], Template],
+        buffer_size: int = 8192,
+        **context: Any
+    ) -> Iterator[str]: ...
+
+    def webpack_runtime_tag(self, nonce: Optional[str]=None) -> Markup: ...
+
     def asset_url_for(
         self,
         asset: str,
@@ -1,8 +1,14 @@
 import pytest
 import os
+import json
+import zlib
 import sys
-from flask import Flask, render_template_string
+import random
+import time
+from decimal import Decimal
+from flask import Flask, Response, render_template_string
 from werkzeug.routing import BuildError
+import flask_webpack
 from flask_webpack import _markup_kvp, _get_attrs, _warn_missing, Webpack
 from lxml.etree import fromstring, XMLParser
 
@@ -337,3 +343,454 @@ def test_chunked_asset_map_deduped():
     assert r1 == r2
     assert r1 == "\n".join((vendor, foo, bar))
     assert r3 == vendor + vendor
+
+
+def _budget_app(**config):
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = os.path.join(
+        __dirname, "test_app_wp1", "build", "manifest.json"
+    )
+    app.config["WEBPACK_BUILD_PATH"] = os.path.join(
+        __dirname, "test_app_wp1", "build", "public"
+    )
+    app.config.update(config)
+    webpack = Webpack(app)
+
+    @app.route("/")
+    def index():
+        return render_template_string(
+            "{{ stylesheet_tag('app_css') }}{{ javascript_tag('app_js') }}"
+        )
+
+    return app, webpack
+
+
+def test_asset_byte_accounting():
+    app, webpack = _budget_app(WEBPACK_TRACK_ASSET_BYTES=True)
+    response = app.test_client().get("/")
+    assert response.headers["X-Webpack-Asset-Bytes"] == str(105 + 2149)
+    gzipped = int(response.headers["X-Webpack-Asset-Gzip-Bytes"])
+    assert 0 < gzipped < 105 + 2149
+    metrics = webpack.metrics["asset_bytes"]["index"]
+    assert metrics["raw"] == metrics["max_raw"] == 105 + 2149
+    assert metrics["gzip"] == gzipped
+
+
+def test_asset_byte_budget_exceeded():
+    app, webpack = _budget_app(WEBPACK_ASSET_BUDGETS={"index": 100})
+    app.testing = True
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/")
+    app.testing = False
+    assert app.test_client().get("/").status_code == 200
+
+
+def test_static_hash_fallback(tmpdir):
+    static = tmpdir.mkdir("static")
+    static.mkdir("fonts").join("icons.woff").write("woff")
+    cache = tmpdir.join("hashes.json")
+    app = Flask("test_app", static_folder=str(static))
+    app.config["WEBPACK_HASH_STATIC"] = True
+    app.config["WEBPACK_STATIC_HASH_CACHE"] = str(cache)
+    Webpack(app, assets_url="/", foo="foo.h4sh3d.js")
+    with app.test_request_context():
+        r1 = render_template_string('{{ asset_url_for("fonts/icons.woff") }}')
+        r2 = render_template_string('{{ asset_url_for("foo") }}')
+        r3 = render_template_string('{{ asset_url_for("../hashes.json") }}')
+    assert r1 == "/static/fonts/icons.woff?v=e631e95698a6"
+    assert r2 == "/foo.h4sh3d.js"
+    assert r3 == "None"
+    mtime, size, digest = json.loads(cache.read())["fonts/icons.woff"]
+    assert (size, digest) == (4, "e631e95698a6")
+
+    # unchanged files are served from the cache rather than re-hashed
+    cache.write(json.dumps({"fonts/icons.woff": [mtime, size, "c4ch3d"]}))
+    webpack = Webpack(app)
+    assert webpack.static_hashes == {"fonts/icons.woff": "c4ch3d"}
+
+
+def test_precache_manifest():
+    path = os.path.join(__dirname, "flat_chunked_asset_map.json")
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = path
+    app.config["WEBPACK_ASSETS_URL"] = "correct/"
+    app.config["WEBPACK_PRECACHE_URL"] = "/precache.json"
+    webpack = Webpack(app)
+    vendor = {"url": "correct/vendor~jquery.ch0nk3d.js", "revision": None}
+    foo = {"url": "correct/foo.h4sh3d.js", "revision": None}
+    assert webpack.precache_manifest(["foo", "vendor~jquery"]) == [vendor, foo]
+    assert len(webpack.precache_manifest()) == 3
+
+    client = app.test_client()
+    response = client.get("/precache.json?entry=foo")
+    assert json.loads(response.data.decode("utf-8")) == [vendor, foo]
+    etag = response.headers["ETag"]
+    cached = client.get(
+        "/precache.json?entry=foo", headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+    gzipped = client.get("/precache.json", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] != etag
+    manifest = json.loads(zlib.decompress(gzipped.data, 31).decode("utf-8"))
+    assert len(manifest) == 3
+
+
+def test_precache_manifest_revisions():
+    path = os.path.join(__dirname, "test_app_wp1", "build", "manifest.json")
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = path
+    webpack = Webpack(app)
+    revisions = {
+        entry["url"].rsplit("/", 1)[-1]: entry["revision"]
+        for entry in webpack.precache_manifest()
+    }
+    assert revisions["app_js.8b7c0de88caa3f366b53.js"] == "8b7c0de88caa3f366b53"
+    assert (
+        revisions["no-idea.b9252d5fd8f39ce3523d303144338d7b.jpg"]
+        == "b9252d5fd8f39ce3523d303144338d7b"
+    )
+
+
+def test_precache_cli():
+    path = os.path.join(__dirname, "flat_chunked_asset_map.json")
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = path
+    app.config["WEBPACK_ASSETS_URL"] = "correct/"
+    Webpack(app)
+    result = app.test_cli_runner().invoke(
+        args=["webpack-precache", "--entry", "vendor~jquery"]
+    )
+    assert json.loads(result.output) == [
+        {"url": "correct/vendor~jquery.ch0nk3d.js", "revision": None}
+    ]
+
+
+def test_webpack_runtime_tag():
+    path = os.path.join(__dirname, "flat_chunked_asset_map.json")
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = path
+    app.config["WEBPACK_ASSETS_URL"] = "https://cdn.example/<assets>/"
+    Webpack(app)
+    with app.app_context():
+        rendered = render_template_string("{{ webpack_runtime_tag() }}")
+        with_nonce = render_template_string(
+            '{{ webpack_runtime_tag(nonce="n0nc3") }}'
+        )
+    public_path = '"https://cdn.example/\\u003cassets\\u003e/"'
+    script = (
+        "window.__webpack_public_path__=" + public_path + ";"
+        "window.__webpack_chunk_urls__={"
+        '"vendor~jquery":' + public_path[:-1] + 'vendor~jquery.ch0nk3d.js"};'
+    )
+    assert rendered == "<script>" + script + "</script>"
+    assert with_nonce == '<script nonce="n0nc3">' + script + "</script>"
+
+
+def test_stream_template():
+    path = os.path.join(__dirname, "flat_chunked_asset_map.json")
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = path
+    app.config["WEBPACK_ASSETS_URL"] = "correct/"
+    webpack = Webpack(app)
+    template = app.jinja_env.from_string(
+        "<head>{{ javascript_tag('vendor~jquery') }}{{ webpack_flush() }}"
+        "</head><body>"
+        "{% for tag in iter_javascript_tags('foo', 'bar.js') %}"
+        "{{ tag }}"
+        "{% endfor %}"
+        "</body>"
+    )
+    vendor = '<script src="correct/vendor~jquery.ch0nk3d.js" ></script>'
+    foo = '<script src="correct/foo.h4sh3d.js" ></script>'
+    bar = '<script src="correct/completely-different.hashed.js" ></script>'
+    with app.test_request_context():
+        chunks = list(webpack.stream_template(template))
+        # chunks streamed earlier in the request are not repeated
+        later = render_template_string("{{ javascript_tag('foo') }}")
+    assert chunks == [
+        "<head>" + vendor,
+        "</head><body>" + foo + bar + "</body>",
+    ]
+    assert later == ""
+
+
+def _reference_markup_kvp(**attrs):
+    """_markup_kvp as it was before attribute serialization was cached"""
+
+    def escape(s):
+        return (
+            s.replace("&", "&amp;")
+            .replace("<", "&lt;")
+            .replace(">", "&gt;")
+            .replace('"', "&quot;")
+            .replace("'", "&#39;")
+        )
+
+    attrs = _get_attrs(attrs)
+    return " ".join(
+        key if value is True else '{}="{}"'.format(key, escape(str(value)))
+        for key, value in attrs.items()
+        if value is not False
+    )
+
+
+def test_markup_kvp_matches_reference():
+    rng = random.Random(1234)
+    keys = ["async", "defer", "nonce", "type", "crossorigin", "data-x", "id"]
+    text = "ab<>&\"' 1"
+
+    def value():
+        return rng.choice(
+            [
+                True,
+                False,
+                None,
+                0,
+                1,
+                1.0,
+                0.0,
+                -0.0,
+                Decimal("1.0"),
+                Decimal("1.00"),
+                (1,),
+                (1.0,),
+                rng.randint(-9, 9),
+                "".join(rng.choice(text) for _ in range(rng.randint(0, 6))),
+            ]
+        )
+
+    for _ in range(2000):
+        attrs = {k: value() for k in rng.sample(keys, rng.randint(0, 5))}
+        if rng.random() < 0.2:
+            attrs["attrs"] = {rng.choice(keys): value()}
+        expected = _reference_markup_kvp(**dict(attrs))
+        assert _markup_kvp(**dict(attrs)) == expected, attrs
+
+
+def test_markup_kvp_nonce():
+    assert (
+        _markup_kvp(defer=True, nonce="a", id="x") == 'defer nonce="a" id="x"'
+    )
+    assert _markup_kvp(defer=True, nonce="<b>", id="x") == (
+        'defer nonce="&lt;b&gt;" id="x"'
+    )
+    assert _markup_kvp(nonce="c") == 'nonce="c"'
+    assert _markup_kvp(attrs={"a": [1]}) == 'a="[1]"'
+
+
+def test_verify_assets(tmpdir):
+    build = tmpdir.mkdir("build")
+    build.join("foo.h4sh3d.js").write("foo")
+    app = Flask("test_app")
+    app.config["WEBPACK_BUILD_PATH"] = str(build)
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    app.config["WEBPACK_VERIFY_ASSETS"] = True
+    webpack = Webpack(
+        app,
+        assets_url="//cdn.example/",
+        foo="foo.h4sh3d.js",
+        bar=["foo.h4sh3d.js", "bar.11a6e2.js"],
+        jquery="//code.jquery.com/jquery.js",
+    )
+    health = webpack.health()
+    assert not health["ready"]
+    assert health["checked"] == 2
+    assert health["missing"] == ["bar.11a6e2.js"]
+    assert health["error"] is None
+
+    build.join("bar.11a6e2.js").write("bar")
+    assert webpack.verify_assets()["ready"]
+
+
+def test_verify_assets_in_background():
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = os.path.join(
+        __dirname, "test_app_wp1", "build", "manifest.json"
+    )
+    app.config["WEBPACK_BUILD_PATH"] = os.path.join(
+        __dirname, "test_app_wp1", "build", "public"
+    )
+    app.config["WEBPACK_VERIFY_ASSETS"] = "background"
+    webpack = Webpack(app)
+    for _ in range(100):
+        if not webpack.health()["pending"]:
+            break
+        time.sleep(0.01)
+    health = webpack.health()
+    assert health["ready"], health
+    assert health["checked"] == 3
+    assert health["verified_generation"] == health["manifest_generation"] == 1
+
+
+def test_health_reports_manifest_error():
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = "/no/such/manifest.json"
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    health = Webpack(app).health()
+    assert not health["ready"]
+    assert "/no/such/manifest.json" in health["error"]
+
+
+def test_profile_lazy_manifest():
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = os.path.join(
+        __dirname, "complete_flat_asset_map.json"
+    )
+    app.config["WEBPACK_PROFILE"] = True
+    app.config["WEBPACK_LAZY_MANIFEST"] = True
+    webpack = Webpack(app)
+    timings = webpack.metrics["timings"]
+    assert sorted(timings) == ["import", "init_app"]
+    assert webpack.assets == {}
+
+    with app.app_context():
+        rendered = render_template_string("{{ javascript_tag('foo') }}")
+        first_render = timings["first_render"]
+        render_template_string("{{ javascript_tag('foo') }}")
+    assert rendered == '<script src="correct/foo.h4sh3d.js" ></script>'
+    assert timings["first_render"] == first_render
+    assert first_render >= timings["manifest_parse"] > 0
+    assert webpack.manifest_generation == 1
+
+
+def test_profile_disabled():
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = os.path.join(
+        __dirname, "complete_flat_asset_map.json"
+    )
+    webpack = Webpack(app)
+    with app.app_context():
+        render_template_string("{{ javascript_tag('foo') }}")
+    assert webpack.metrics["timings"] == {}
+
+
+def test_stream_template_asset_budget():
+    app, webpack = _budget_app(WEBPACK_ASSET_BUDGETS={"streamed": 10})
+    template = app.jinja_env.from_string("{{ javascript_tag('app_js') }}")
+
+    @app.route("/streamed")
+    def streamed():
+        return Response(webpack.stream_template(template))
+
+    app.testing = True
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/streamed").get_data()
+    app.testing = False
+    response = app.test_client().get("/streamed")
+    assert b"app_js.8b7c0de88caa3f366b53.js" in response.get_data()
+    # headers were sent before the template rendered its chunks
+    assert "X-Webpack-Asset-Bytes" not in response.headers
+    assert webpack.metrics["asset_bytes"]["streamed"]["raw"] == 2149
+
+
+def test_verify_assets_in_background_failure():
+    app = Flask("test_app")
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    app.config["WEBPACK_VERIFY_ASSETS"] = "background"
+    webpack = Webpack(app, foo=None)
+    for _ in range(100):
+        if not webpack.health()["pending"]:
+            break
+        time.sleep(0.01)
+    health = webpack.health()
+    assert not health["pending"]
+    assert not health["ready"]
+    assert "asset verification failed" in health["error"]
+
+
+def test_lazy_manifest_bad_path():
+    app = Flask("test_app")
+    app.config["WEBPACK_MANIFEST_PATH"] = "/no/such/manifest.json"
+    app.config["WEBPACK_LAZY_MANIFEST"] = True
+    with pytest.raises(RuntimeError):
+        Webpack(app)
+
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    app.config["WEBPACK_VERIFY_ASSETS"] = "background"
+    webpack = Webpack(app)
+    for _ in range(100):
+        if not webpack.health()["pending"]:
+            break
+        time.sleep(0.01)
+    health = webpack.health()
+    assert not health["pending"]
+    assert not health["ready"]
+    assert "/no/such/manifest.json" in health["error"]
+
+
+def test_static_hash_refreshed_in_debug(tmpdir):
+    static = tmpdir.mkdir("static")
+    static.join("logo.svg").write("old")
+    static.join("..logo.svg").write("dots")
+    app = Flask("test_app", static_folder=str(static))
+    app.config["DEBUG"] = True
+    app.config["WEBPACK_HASH_STATIC"] = True
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    Webpack(app, assets_url="/")
+    app.add_url_rule(
+        "/",
+        "index",
+        lambda: render_template_string(
+            '{{ asset_url_for("logo.svg") }} {{ asset_url_for("..logo.svg") }}'
+        ),
+    )
+    client = app.test_client()
+    before = client.get("/").data
+    static.join("logo.svg").write("new")
+    after = client.get("/").data
+    assert before != after
+    assert b"/static/..logo.svg?v=" in after
+
+
+def test_static_hash_url(tmpdir):
+    static = tmpdir.mkdir("static")
+    static.join("my logo.svg").write("svg")
+    static.join("broken.svg").mksymlinkto(tmpdir.join("missing.svg"))
+    app = Flask("test_app", static_folder=str(static))
+    app.config["WEBPACK_HASH_STATIC"] = True
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    webpack = Webpack(app, assets_url="/")
+    assert list(webpack.static_hashes) == ["my logo.svg"]
+    with app.test_request_context(base_url="http://localhost/prefix/"):
+        r1 = render_template_string('{{ asset_url_for("my logo.svg") }}')
+        r2 = render_template_string('{{ asset_url_for("./my logo.svg") }}')
+        r3 = render_template_string('{{ asset_url_for("broken.svg") }}')
+    assert r1 == r2
+    assert r1.startswith("/prefix/static/my%20logo.svg?v=")
+    assert r3 == "None"
+    assert list(webpack.static_hashes) == ["my logo.svg"]
+
+
+def test_asset_byte_sizes_survive_manifest_reload(monkeypatch):
+    app, webpack = _budget_app(WEBPACK_TRACK_ASSET_BYTES=True)
+    client = app.test_client()
+    calls = []
+    gzip = flask_webpack._gzip
+    monkeypatch.setattr(
+        flask_webpack,
+        "_gzip",
+        lambda *a, **kw: calls.append(a) or gzip(*a, **kw),
+    )
+    first = client.get("/").headers["X-Webpack-Asset-Gzip-Bytes"]
+    assert len(calls) == 2
+    webpack._set_asset_paths(app)  # as in debug mode, before every request
+    second = client.get("/").headers["X-Webpack-Asset-Gzip-Bytes"]
+    assert len(calls) == 2, "unchanged chunks were compressed again"
+    assert first == second
+
+
+def test_lazy_manifest_defers_static_hashing(tmpdir):
+    static = tmpdir.mkdir("static")
+    static.join("logo.svg").write("svg")
+    app = Flask("test_app", static_folder=str(static))
+    app.config["WEBPACK_HASH_STATIC"] = True
+    app.config["WEBPACK_LAZY_MANIFEST"] = True
+    app.config["WEBPACK_LOG_LEVEL"] = "INFO"
+    webpack = Webpack(app, assets_url="/")
+    assert webpack.static_hashes == {}
+    with app.test_request_context():
+        rendered = render_template_string('{{ asset_url_for("logo.svg") }}')
+    assert rendered.startswith("/static/logo.svg?v=")
+    assert list(webpack.static_hashes) == ["logo.svg"]